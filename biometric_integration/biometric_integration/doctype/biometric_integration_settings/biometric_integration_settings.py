@@ -1,10 +1,13 @@
 import frappe
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from frappe.model.document import Document
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPDigestAuth
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
 
 from biometric_integration.employee_checkin_sync import (
+    _has_col,
     sync_punches_to_employee_checkin,
 )
 
@@ -13,6 +16,27 @@ class BiometricIntegrationSettings(Document):
     pass
 
 
+# One Session per device IP, reused across batches and sync runs so we keep
+# the TCP connection and the digest nonce instead of re-handshaking per request.
+_session_cache = {}
+
+
+def _get_session(ip, username, password):
+    """Return a cached requests.Session for this device with digest auth attached."""
+    session = _session_cache.get(ip)
+    if session is None:
+        session = requests.Session()
+        session.auth = HTTPDigestAuth(username, password)
+        session.headers.update({"Content-Type": "application/json"})
+        session.verify = False
+        session.mount("http://", HTTPAdapter(pool_connections=2, pool_maxsize=4))
+        _session_cache[ip] = session
+    else:
+        # Credentials may have been edited in settings since the session was built
+        session.auth = HTTPDigestAuth(username, password)
+    return session
+
+
 def _get_device_configs(settings):
     """Return a list of (label, ip, username, password) for all active devices.
 
@@ -46,69 +70,97 @@ def _sync_for_single_device(settings, label, ip, username, password, start_time,
     Sync attendance for a single device (one IP).
     Returns (count, skipped) for that device.
     Also sets device_id (IP) on logs and punches if those fields exist.
+
+    Runs as one explicit DB transaction: all writes for the device are
+    committed together, or rolled back if the sync fails part-way.
     """
-    url = f"http://{ip}/ISAPI/AccessControl/AcsEvent?format=json"
-    headers = {"Content-Type": "application/json"}
+    frappe.db.begin()
+    try:
+        result = _fetch_and_store_events(label, ip, username, password, start_time, end_time)
+    except Exception:
+        frappe.db.rollback()
+        raise
+    frappe.db.commit()
+    return result
 
-    log_has_device_id = frappe.db.has_column("Biometric Attendance Log", "device_id")
-    punch_has_device_id = frappe.db.has_column(
-        "Biometric Attendance Punch Table", "device_id"
-    )
 
-    # Initial fetch to determine total records
-    payload = {
-        "AcsEventCond": {
-            "searchID": "123456789",
-            "searchResultPosition": 0,
-            "maxResults": 1,
-            "major": 5,
-            "minor": 75,
-            "startTime": start_time,
-            "endTime": end_time,
-        }
-    }
-
-    response = requests.post(
-        url,
-        auth=HTTPDigestAuth(username, password),
-        headers=headers,
-        json=payload,
-        verify=False,
-        timeout=600,
-    )
+def _existing_punch_keys(parents):
+    """
+    Return (log name, "HH:MM:SS") pairs for every punch of the given logs.
 
-    if response.status_code != 200:
-        frappe.throw(
-            f"[{label}] Failed to fetch attendance logs. "
-            f"Status: {response.status_code}, Response: {response.text}"
-        )
+    punch_time is a time(6) column, so TIME_FORMAT is used to drop the
+    fractional seconds — the keys must match the "HH:MM:SS" slice taken
+    from the device timestamps, or re-runs would re-insert every punch.
+    """
+    return frappe.db.sql(
+        """
+        SELECT parent, TIME_FORMAT(punch_time, '%%H:%%i:%%s')
+        FROM `tabBiometric Attendance Punch Table`
+        WHERE parent IN %(parents)s
+        """,
+        {"parents": tuple(parents)},
+    )
 
-    data = response.json()
-    total_records = data.get("AcsEvent", {}).get("totalMatches", 0)
 
-    if total_records == 0:
-        return 0, 0
+def _fetch_and_store_events(label, ip, username, password, start_time, end_time):
+    url = f"http://{ip}/ISAPI/AccessControl/AcsEvent?format=json"
+    session = _get_session(ip, username, password)
+
+    log_has_device_id = _has_col("Biometric Attendance Log", "device_id")
+    punch_has_device_id = _has_col("Biometric Attendance Punch Table", "device_id")
+
+    # No "count first" probe — start paginating right away and let the
+    # short-page check below terminate the loop.
+    # Only the position and page size change between requests, so the JSON
+    # body is built once as a template instead of re-serializing a dict
+    # on every page (the session already carries the Content-Type header).
+    body_tpl = (
+        '{"AcsEventCond": {"searchID": "123456789",'
+        ' "searchResultPosition": %d, "maxResults": %d,'
+        ' "major": 5, "minor": 75,'
+        ' "startTime": "' + start_time + '", "endTime": "' + end_time + '"}}'
+    )
 
-    if total_records > 1500:
-        frappe.throw(f"[{label}] Too many records to process ({total_records}). Reduce date range.")
+    max_records = 1500
 
     count = 0
     skipped = 0
     position = 0
-    batch_size = 30
+    # The AcsEvent search endpoint handles well above 30 results per page;
+    # larger pages cut the number of HTTP round-trips per device ~3x
+    batch_size = 100
+
+    # (employee_no, "YYYY-MM-DD") -> Biometric Attendance Log name,
+    # filled batch-wise so we don't run one SELECT per event
+    log_cache = {}
+
+    # Punch rows accumulated in memory and bulk-inserted once at the end,
+    # instead of a full doc.save() per event; owner/creation/modified/
+    # modified_by are set explicitly since bulk_insert bypasses the ORM
+    punch_fields = [
+        "name",
+        "owner",
+        "creation",
+        "modified",
+        "modified_by",
+        "parent",
+        "parentfield",
+        "parenttype",
+        "idx",
+        "punch_time",
+        "punch_type",
+    ]
+    if punch_has_device_id:
+        punch_fields.append("device_id")
+    now = frappe.utils.now()
+    user = frappe.session.user
+    new_punches = []
+    existing_punches = set()  # (log name, "HH:MM:SS") already in DB or queued this run
+    fetched_parents = set()  # logs whose punch times are already loaded
+    punch_counts = {}  # log name -> current number of punch rows (for idx)
 
     while True:
-        payload["AcsEventCond"]["searchResultPosition"] = position
-        payload["AcsEventCond"]["maxResults"] = batch_size
-
-        response = requests.post(
-            url,
-            auth=HTTPDigestAuth(username, password),
-            headers=headers,
-            json=payload,
-            verify=False,
-            timeout=600,
-        )
+        response = session.post(url, data=body_tpl % (position, batch_size), timeout=60)
 
         if response.status_code != 200:
             frappe.throw(
@@ -122,6 +174,41 @@ def _sync_for_single_device(settings, label, ip, username, password, start_time,
         if not events:
             break
 
+        if position + len(events) > max_records:
+            frappe.throw(
+                f"[{label}] Too many records to process (over {max_records}). Reduce date range."
+            )
+
+        # Prefetch existing logs for the whole batch in one query
+        pairs = {
+            (e.get("employeeNoString"), e.get("time", "")[:10])
+            for e in events
+            if e.get("employeeNoString") and e.get("time")
+        }
+        missing = [p for p in pairs if p not in log_cache]
+        if missing:
+            rows = frappe.db.sql(
+                """
+                SELECT name, employee_no, event_date
+                FROM `tabBiometric Attendance Log`
+                WHERE (employee_no, event_date) IN %(pairs)s
+                """,
+                {"pairs": tuple(missing)},
+            )
+            for name, employee_no, event_date in rows:
+                log_cache[(employee_no, str(event_date))] = name
+
+        # Prefetch punch times of any newly seen logs in one grouped query,
+        # instead of a duplicate-check SELECT per event
+        new_parents = [n for n in log_cache.values() if n not in fetched_parents]
+        if new_parents:
+            for parent, punch_time in _existing_punch_keys(new_parents):
+                existing_punches.add((parent, punch_time))
+                punch_counts[parent] = punch_counts.get(parent, 0) + 1
+            for parent in new_parents:
+                fetched_parents.add(parent)
+                punch_counts.setdefault(parent, 0)
+
         for log in events:
             emp_no = log.get("employeeNoString")
             event_timestamp = log.get("time", "")
@@ -129,71 +216,120 @@ def _sync_for_single_device(settings, label, ip, username, password, start_time,
                 continue
 
             # Convert device time format to Frappe format
-            event_datetime = datetime.strptime(event_timestamp[:19], "%Y-%m-%dT%H:%M:%S")
-
-            # Create or get Attendance Log doc for employee and date
-            attendance_log = frappe.get_all(
-                "Biometric Attendance Log",
-                filters={"employee_no": emp_no, "event_date": event_datetime.date()},
-                limit_page_length=1,
-            )
-            if attendance_log:
-                doc = frappe.get_doc("Biometric Attendance Log", attendance_log[0].name)
-            else:
+            # (fromisoformat is much cheaper than strptime in this loop)
+            event_datetime = datetime.fromisoformat(event_timestamp[:19])
+            event_date = event_datetime.date()
+            event_time = event_datetime.time()
+
+            # Create or get Attendance Log for employee and date
+            log_key = (emp_no, event_timestamp[:10])
+            log_name = log_cache.get(log_key)
+            if not log_name:
                 doc = frappe.new_doc("Biometric Attendance Log")
                 doc.employee_no = emp_no
-                doc.event_date = event_datetime.date()
-
-            # Set device_id on log if field exists
-            if log_has_device_id:
-                doc.device_id = ip
-
-            # Avoid exact duplicate punch time for that employee/date
-            existing_punch = (
-                frappe.db.sql(
-                    """
-                    SELECT COUNT(*)
-                    FROM `tabBiometric Attendance Punch Table`
-                    WHERE parent = %(parent)s
-                      AND punch_time = %(punch_time)s
-                """,
-                    {
-                        "parent": doc.name,
-                        "punch_time": event_datetime.time(),
-                    },
-                )[0][0]
-                > 0
-            )
-
-            if not existing_punch:
-                punch_row = {
-                    "punch_time": event_datetime.time(),
-                    "punch_type": "Auto",  # device punch
-                }
-                if punch_has_device_id:
-                    punch_row["device_id"] = ip
-
-                doc.append("punch_table", punch_row)
+                doc.event_date = event_date
+                if log_has_device_id:
+                    doc.device_id = ip
                 try:
-                    doc.save(ignore_permissions=True)
-                    count += 1
+                    # Insert the parent log only; punches go in via bulk_insert below
+                    doc.insert(ignore_permissions=True)
+                    log_name = doc.name
+                    punch_counts[log_name] = 0
+                except (frappe.DuplicateEntryError, frappe.UniqueValidationError):
+                    # Another device thread created the log for this
+                    # (employee_no, event_date) first — the unique index from
+                    # v1_4 turns the race into a duplicate-key error, so take
+                    # over the winner's row and its already-stored punches
+                    log_name = frappe.db.get_value(
+                        "Biometric Attendance Log",
+                        {"employee_no": emp_no, "event_date": event_date},
+                    )
+                    if not log_name:
+                        # Winner's row not visible to this transaction yet;
+                        # the next scheduled run picks the event up
+                        skipped += 1
+                        continue
+                    for parent, punch_time in _existing_punch_keys([log_name]):
+                        existing_punches.add((parent, punch_time))
+                        punch_counts[parent] = punch_counts.get(parent, 0) + 1
+                    punch_counts.setdefault(log_name, 0)
                 except Exception:
                     frappe.log_error(
                         frappe.get_traceback(),
                         f"[{label}] Insert failed for employee {emp_no}",
                     )
                     continue
-            else:
+                log_cache[log_key] = log_name
+                fetched_parents.add(log_name)
+
+            # Avoid exact duplicate punch time for that employee/date
+            punch_key = (log_name, event_timestamp[11:19])
+            if punch_key in existing_punches:
                 skipped += 1
+                continue
+
+            punch_counts[log_name] += 1
+
+            punch_row = [
+                frappe.generate_hash(length=10),
+                user,
+                now,
+                now,
+                user,
+                log_name,
+                "punch_table",
+                "Biometric Attendance Log",
+                punch_counts[log_name],
+                event_time,
+                "Auto",  # device punch
+            ]
+            if punch_has_device_id:
+                punch_row.append(ip)
+
+            new_punches.append(tuple(punch_row))
+            existing_punches.add(punch_key)
+            count += 1
 
         position += len(events)
 
         if len(events) < batch_size:
             break
 
+    if new_punches:
+        frappe.db.bulk_insert(
+            "Biometric Attendance Punch Table",
+            fields=punch_fields,
+            values=new_punches,
+        )
+
     return count, skipped
 
 
+def _sync_device_in_thread(site, settings, label, ip, username, password, start_time, end_time):
+    """
+    Run _sync_for_single_device inside a worker thread.
+
+    frappe.local is thread-local, so each worker opens its own DB
+    connection for the site and cleans it up before returning;
+    _sync_for_single_device commits its own transaction.
+    """
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        result = _sync_for_single_device(
+            settings=settings,
+            label=label,
+            ip=ip,
+            username=username,
+            password=password,
+            start_time=start_time,
+            end_time=end_time,
+        )
+        return result
+    finally:
+        frappe.destroy()
+
+
 @frappe.whitelist()
 def sync_attendance():
     """
@@ -226,7 +362,9 @@ def sync_attendance_device_only():
         -> fill Biometric Attendance Log + Punch Table
     Does NOT create Employee Checkins. Used internally and can be called separately.
     """
-    settings = frappe.get_doc("Biometric Integration Settings", "Biometric Integration Settings")
+    settings = frappe.get_cached_doc(
+        "Biometric Integration Settings", "Biometric Integration Settings"
+    )
 
     # Prepare time window used for ALL devices
     start_time = datetime.strptime(
@@ -249,24 +387,30 @@ def sync_attendance_device_only():
         description="Starting attendance sync from devices...",
     )
 
-    for idx, (label, ip, username, password) in enumerate(device_configs, start=1):
-        frappe.publish_progress(
-            (idx - 1) * 100.0 / max(len(device_configs), 1),
-            title="Attendance Sync",
-            description=f"Syncing device {idx}/{len(device_configs)}: {label} ({ip})",
-        )
-
-        c, s = _sync_for_single_device(
-            settings=settings,
-            label=label,
-            ip=ip,
-            username=username,
-            password=password,
-            start_time=start_time,
-            end_time=end_time,
-        )
-        total_count += c
-        total_skipped += s
+    # Devices are independent network targets, so poll them concurrently;
+    # each worker thread syncs (and commits) one device at a time.
+    site = frappe.local.site
+    max_workers = min(8, len(device_configs))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(
+                _sync_device_in_thread,
+                site, settings, label, ip, username, password, start_time, end_time,
+            ): (label, ip)
+            for (label, ip, username, password) in device_configs
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            c, s = future.result()
+            total_count += c
+            total_skipped += s
+
+            label, ip = futures[future]
+            frappe.publish_progress(
+                done * 100.0 / len(device_configs),
+                title="Attendance Sync",
+                description=f"Synced device {done}/{len(device_configs)}: {label} ({ip})",
+            )
 
     # Save all logs/punches
     frappe.db.commit()
@@ -310,24 +454,29 @@ def scheduled_attendance_sync():
         * sync_to_employee_checkin_only()    -> convert punches -> Employee Checkin
     """
     try:
-        settings = frappe.get_doc("Biometric Integration Settings", "Biometric Integration Settings")
-
         BACK_DAYS = 3  # change to 5 if you prefer last 5 days
 
         today = datetime.now().date()
         start_date = today - timedelta(days=BACK_DAYS - 1)
 
-        start_time = datetime.combine(
-            start_date, datetime.strptime("00:00:00", "%H:%M:%S").time()
+        start_time = datetime.combine(start_date, time(0, 0, 0))
+        end_time = datetime.combine(today, time(23, 59, 59))
+
+        # Only the date range changes — write it directly instead of a full
+        # settings.save() (no controller hooks, no modified bump), then drop
+        # the cached copy so the enqueued sync reads the new window
+        frappe.db.set_single_value(
+            "Biometric Integration Settings",
+            {
+                "start_date_and_time": start_time.strftime("%Y-%m-%d %H:%M:%S"),
+                "end_date_and_time": end_time.strftime("%Y-%m-%d %H:%M:%S"),
+            },
+            update_modified=False,
         )
-        end_time = datetime.combine(
-            today, datetime.strptime("23:59:59", "%H:%M:%S").time()
+        frappe.clear_document_cache(
+            "Biometric Integration Settings", "Biometric Integration Settings"
         )
 
-        settings.start_date_and_time = start_time.strftime("%Y-%m-%d %H:%M:%S")
-        settings.end_date_and_time = end_time.strftime("%Y-%m-%d %H:%M:%S")
-        settings.save()
-
         # 1) Fetch from devices (logs + punches)
         frappe.enqueue(
             "biometric_integration.biometric_integration.doctype.biometric_integration_settings.biometric_integration_settings.sync_attendance_device_only",
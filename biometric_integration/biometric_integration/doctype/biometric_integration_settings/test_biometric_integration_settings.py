@@ -1,9 +1,35 @@
 # Copyright (c) 2025, NDV and Contributors
 # See license.txt
 
-# import frappe
+import frappe
 from frappe.tests.utils import FrappeTestCase
 
+from biometric_integration.biometric_integration.doctype.biometric_integration_settings.biometric_integration_settings import (
+	_existing_punch_keys,
+)
+
 
 class TestBiometricIntegrationSettings(FrappeTestCase):
-	pass
+	def test_existing_punch_keys_match_device_timestamps(self):
+		"""Punches already in the DB must be seen as duplicates on re-runs.
+
+		The sync keys punches as (log name, "HH:MM:SS") sliced from the
+		device timestamp; punch_time is a time(6) column, so the prefetch
+		has to render it without fractional seconds or nothing matches
+		and every scheduler run re-inserts the whole window.
+		"""
+		log = frappe.get_doc(
+			{
+				"doctype": "Biometric Attendance Log",
+				"employee_no": "_TEST-PUNCH-KEYS",
+				"event_date": "2025-01-01",
+			}
+		)
+		log.append("punch_table", {"punch_time": "08:30:15", "punch_type": "Auto"})
+		log.insert(ignore_permissions=True)
+
+		existing = set(_existing_punch_keys([log.name]))
+
+		# Same slice the sync loop takes from the device event time
+		event_timestamp = "2025-01-01T08:30:15+08:00"
+		self.assertIn((log.name, event_timestamp[11:19]), existing)
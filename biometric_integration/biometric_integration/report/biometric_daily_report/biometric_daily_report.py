@@ -46,54 +46,47 @@ def execute(filters=None):
 
     present_employee_ids = {emp.attendance_device_id for emp in present_employees}
 
-    # ⚠️ FIXED — safe natural sorting that never crashes
-    def natural_sort_key(emp):
-        """
-        Sort employees by attendance_device_id numerically.
-        If missing or non-numeric, treat as 0.
-        """
-        value = emp.get("attendance_device_id")
-
-        if not value:
-            return 0
-        try:
-            return int(value)
-        except (TypeError, ValueError):
-            return 0
+    # ⚠️ FIXED — safe natural sorting that never crashes.
+    # The numeric key is computed once per row with str.isdigit (no
+    # try/except per comparison); missing or non-numeric ids sort as 0.
+    def assign_sort_keys(employees):
+        for emp in employees:
+            value = emp.get("attendance_device_id")
+            emp["_sortk"] = int(value) if value and str(value).isdigit() else 0
 
     # Sort
-    present_employees.sort(key=natural_sort_key)
+    assign_sort_keys(present_employees)
+    present_employees.sort(key=lambda e: e["_sortk"])
 
     data = []
     max_punches = 0
     valid_minutes = []
 
+    # Fetch all punches of the day in one joined query and group them in
+    # Python, instead of one logs query per employee + one punches query per log
+    punch_rows = frappe.db.sql(
+        """
+        SELECT
+            al.employee_no,
+            al.name AS log_name,
+            at.punch_time,
+            at.punch_type
+        FROM `tabBiometric Attendance Log` al
+        JOIN `tabBiometric Attendance Punch Table` at ON at.parent = al.name
+        WHERE al.event_date = %(date)s
+        ORDER BY al.employee_no, al.name, at.punch_time
+        """,
+        {"date": selected_date},
+        as_dict=True,
+    )
+
+    punches_by_emp = {}
+    for p in punch_rows:
+        punches_by_emp.setdefault(p.employee_no, {}).setdefault(p.log_name, []).append(p)
+
     # Process each present employee
     for employee in present_employees:
-        attendance_logs = frappe.db.sql(
-            """
-            SELECT al.name, al.event_date
-            FROM `tabBiometric Attendance Log` al
-            WHERE al.employee_no = %(emp)s
-              AND al.event_date = %(date)s
-            ORDER BY al.event_date
-            """,
-            {"emp": employee.attendance_device_id, "date": selected_date},
-            as_dict=True,
-        )
-
-        for log in attendance_logs:
-            punches = frappe.db.sql(
-                """
-                SELECT at.punch_time, at.punch_type
-                FROM `tabBiometric Attendance Punch Table` at
-                WHERE at.parent = %(log)s
-                ORDER BY at.punch_time
-                """,
-                {"log": log.name},
-                as_dict=True,
-            )
-
+        for punches in punches_by_emp.get(employee.attendance_device_id, {}).values():
             row_data = {
                 "employee_name": employee.employee_name,
                 "employee_id": employee.attendance_device_id,
@@ -140,12 +133,9 @@ def execute(filters=None):
     for row in data:
         row_data = row["data"].copy()
 
-        # Apply color indicators
+        # Apply color indicators (plain f-string — no Jinja render per cell)
         for field, color in row["indicators"].items():
-            row_data[field] = frappe.render_template(
-                '<span style="color: {{ color }}">{{ value }}</span>',
-                {"value": row_data[field], "color": color},
-            )
+            row_data[field] = f'<span style="color: {color}">{row_data[field]}</span>'
 
         # Fill missing punches with None
         for i in range(1, max_punches + 1):
@@ -171,7 +161,8 @@ def execute(filters=None):
     absent_employees = [
         emp for emp in all_active_employees if emp.attendance_device_id not in present_employee_ids
     ]
-    absent_employees.sort(key=natural_sort_key)
+    assign_sort_keys(absent_employees)
+    absent_employees.sort(key=lambda e: e["_sortk"])
 
     for emp in absent_employees:
         formatted_data.append({
@@ -1,7 +1,30 @@
+import functools
+import time
+from datetime import datetime
+
 import frappe
-from frappe.utils import get_datetime
 import requests
 
+
+@functools.lru_cache(maxsize=None)
+def _site_has_col(site, doctype, fieldname):
+    return frappe.db.has_column(doctype, fieldname)
+
+
+def _has_col(doctype, fieldname):
+    """
+    Cached frappe.db.has_column — each call is a DB introspection query
+    and the schema doesn't change between sync runs. The cache is keyed
+    on the current site, since lru_cache is process-wide and on a
+    multi-site bench each site has its own schema.
+
+    Patches that add custom fields must call _has_col.cache_clear().
+    """
+    return _site_has_col(frappe.local.site, doctype, fieldname)
+
+
+_has_col.cache_clear = _site_has_col.cache_clear
+
 # -------------------------------
 # Geolocation helpers
 # -------------------------------
@@ -10,24 +33,37 @@ import requests
 DEFAULT_LAT = 31.4812872
 DEFAULT_LON = 74.2520218
 
+# Reused across sync runs so we keep the TLS connection to ipinfo.io
+_geo_session = requests.Session()
+
+# The site location doesn't move, so the ipinfo.io answer is cached
+# in-process for a day instead of being fetched on every scheduled sync
+_geo_cache = {"ts": 0, "val": None}
+GEO_CACHE_TTL = 24 * 60 * 60  # seconds
+
 
 def get_geolocation():
     """
     Try to get geolocation from ipinfo.io.
     If it fails, return DEFAULT_LAT/LON.
 
-    This is called ONCE per sync and reused for all Employee Checkins.
+    The result is cached for 24 hours across sync runs.
     """
+    now = time.time()
+    if _geo_cache["val"] and now - _geo_cache["ts"] < GEO_CACHE_TTL:
+        return _geo_cache["val"]
+
     try:
-        r = requests.get("https://ipinfo.io/json", timeout=5)
+        r = _geo_session.get("https://ipinfo.io/json", timeout=5)
         if r.status_code == 200:
             data = r.json()
             loc = data.get("loc")
             if loc:
                 lat_str, lon_str = loc.split(",")
-                return float(lat_str), float(lon_str)
+                _geo_cache.update(ts=now, val=(float(lat_str), float(lon_str)))
+                return _geo_cache["val"]
     except Exception:
-        # Silently fall back
+        # Silently fall back (and don't cache the fallback)
         pass
 
     return DEFAULT_LAT, DEFAULT_LON
@@ -57,20 +93,18 @@ def sync_punches_to_employee_checkin():
     """
 
     # Check optional columns exist (DB-level)
-    punch_has_employee_checkin = frappe.db.has_column(
+    punch_has_employee_checkin = _has_col(
         "Biometric Attendance Punch Table", "employee_checkin"
     )
-    checkin_has_biometric_log = frappe.db.has_column("Employee Checkin", "biometric_log")
-    checkin_has_biometric_punch = frappe.db.has_column(
-        "Employee Checkin", "biometric_punch"
-    )
-    checkin_has_device_id = frappe.db.has_column("Employee Checkin", "device_id")
+    checkin_has_biometric_log = _has_col("Employee Checkin", "biometric_log")
+    checkin_has_biometric_punch = _has_col("Employee Checkin", "biometric_punch")
+    checkin_has_device_id = _has_col("Employee Checkin", "device_id")
 
     # Geolocation-related fields
-    checkin_has_latitude = frappe.db.has_column("Employee Checkin", "latitude")
-    checkin_has_longitude = frappe.db.has_column("Employee Checkin", "longitude")
-    checkin_has_geo_latitude = frappe.db.has_column("Employee Checkin", "geo_latitude")
-    checkin_has_geo_longitude = frappe.db.has_column("Employee Checkin", "geo_longitude")
+    checkin_has_latitude = _has_col("Employee Checkin", "latitude")
+    checkin_has_longitude = _has_col("Employee Checkin", "longitude")
+    checkin_has_geo_latitude = _has_col("Employee Checkin", "geo_latitude")
+    checkin_has_geo_longitude = _has_col("Employee Checkin", "geo_longitude")
 
     # Fetch geolocation once for this sync
     latitude, longitude = get_geolocation()
@@ -108,18 +142,87 @@ def sync_punches_to_employee_checkin():
         key = (p["employee_no"], p["event_date"])
         groups.setdefault(key, []).append(p)
 
+    # Map device employee_no -> Employee for ALL groups in one query,
+    # instead of a frappe.db.get_value per group
+    emp_nos = {emp_no for (emp_no, _date) in groups if emp_no}
+    employee_map = {}
+    if emp_nos:
+        for row in frappe.db.sql(
+            """
+            SELECT attendance_device_id, name, status
+            FROM `tabEmployee`
+            WHERE attendance_device_id IN %(ids)s
+            """,
+            {"ids": tuple(emp_nos)},
+            as_dict=True,
+        ):
+            employee_map[row.attendance_device_id] = row
+
+    # Prefetch existing Employee Checkin (employee, time) pairs for all
+    # covered dates in one query, instead of frappe.db.exists per punch
+    dates = {event_date for (_emp_no, event_date) in groups}
+    existing_checkins = set()
+    if dates:
+        for employee, checkin_time in frappe.db.sql(
+            """
+            SELECT employee, time
+            FROM `tabEmployee Checkin`
+            WHERE DATE(time) IN %(dates)s
+            """,
+            {"dates": tuple(dates)},
+        ):
+            existing_checkins.add((employee, checkin_time))
+
+    # New checkins are accumulated and written with one bulk_insert;
+    # optional columns are only included when they exist
+    checkin_fields = [
+        "name",
+        "owner",
+        "creation",
+        "modified",
+        "modified_by",
+        "employee",
+        "time",
+        "log_type",
+    ]
+    if checkin_has_device_id:
+        checkin_fields.append("device_id")
+    if checkin_has_latitude:
+        checkin_fields.append("latitude")
+    if checkin_has_longitude:
+        checkin_fields.append("longitude")
+    if checkin_has_geo_latitude:
+        checkin_fields.append("geo_latitude")
+    if checkin_has_geo_longitude:
+        checkin_fields.append("geo_longitude")
+    if checkin_has_biometric_log:
+        checkin_fields.append("biometric_log")
+    if checkin_has_biometric_punch:
+        checkin_fields.append("biometric_punch")
+
+    # Shift fields are normally filled by EmployeeCheckin.fetch_shift during
+    # insert(); bulk_insert bypasses the controller, and without a shift HRMS
+    # auto-attendance never processes the checkin — so they are computed per
+    # row below on an in-memory doc
+    shift_fields = [
+        f
+        for f in ("shift", "shift_start", "shift_end", "shift_actual_start", "shift_actual_end")
+        if _has_col("Employee Checkin", f)
+    ]
+    checkin_fields.extend(shift_fields)
+
+    new_checkins = []
+    synced_names = []  # punches to flag synced_to_employee_checkin in one UPDATE
+    checkin_links = []  # (punch name, checkin name) pairs to link afterwards
+    now = frappe.utils.now()
+    user = frappe.session.user
+
     for (emp_no, event_date), group_punches in groups.items():
         # If no device employee number, just skip this group
         if not emp_no:
             continue
 
-        # Map device employee_no -> Employee via attendance_device_id
-        emp_row = frappe.db.get_value(
-            "Employee",
-            {"attendance_device_id": emp_no},
-            ["name", "status"],
-            as_dict=True,
-        )
+        emp_row = employee_map.get(emp_no)
 
         # If no Employee found OR Employee is not Active → skip silently
         if not emp_row or emp_row.status != "Active":
@@ -139,62 +242,63 @@ def sync_punches_to_employee_checkin():
         def _create_checkin_for_punch(punch, log_type):
             nonlocal created, already_synced
 
-            time_str = f"{event_date} {punch['punch_time']}"
-            punch_dt = get_datetime(time_str)
+            # punch_time comes back from MariaDB as a timedelta; combining it
+            # with the date directly skips a string round-trip + parse
+            punch_dt = datetime.combine(event_date, datetime.min.time()) + punch["punch_time"]
 
             # Avoid duplicate Employee Checkin rows for the same employee+time
-            exists = frappe.db.exists(
-                "Employee Checkin",
-                {"employee": employee, "time": punch_dt},
-            )
-            if exists:
+            if (employee, punch_dt) in existing_checkins:
                 already_synced += 1
-                frappe.db.set_value(
-                    "Biometric Attendance Punch Table",
-                    punch["punch_name"],
-                    "synced_to_employee_checkin",
-                    1,
-                )
+                synced_names.append(punch["punch_name"])
                 return
 
-            checkin = frappe.new_doc("Employee Checkin")
-            checkin.employee = employee
-            checkin.time = punch_dt
-            checkin.log_type = log_type  # 'IN' or 'OUT'
-
-            # Device ID (prefer punch device_id, fall back to log device_id)
-            device_id = punch.get("punch_device_id") or punch.get("log_device_id")
-            if checkin_has_device_id and device_id:
-                checkin.device_id = device_id
-
-            # Geolocation fields: required when "Allow Geolocation Tracking" is enabled
-            if checkin_has_latitude:
-                checkin.latitude = latitude
-            if checkin_has_longitude:
-                checkin.longitude = longitude
-            if checkin_has_geo_latitude:
-                checkin.geo_latitude = latitude
-            if checkin_has_geo_longitude:
-                checkin.geo_longitude = longitude
-
-            # Optional back-links to biometric log/punch if those fields exist
-            if checkin_has_biometric_log:
-                checkin.biometric_log = punch["log_name"]
-            if checkin_has_biometric_punch:
-                checkin.biometric_punch = punch["punch_name"]
-
-            checkin.insert(ignore_permissions=True)
+            checkin = {
+                "name": frappe.generate_hash(length=10),
+                "owner": user,
+                "creation": now,
+                "modified": now,
+                "modified_by": user,
+                "employee": employee,
+                "time": punch_dt,
+                "log_type": log_type,  # 'IN' or 'OUT'
+                # Device ID (prefer punch device_id, fall back to log device_id)
+                "device_id": punch.get("punch_device_id") or punch.get("log_device_id"),
+                # Geolocation fields: required when "Allow Geolocation
+                # Tracking" is enabled
+                "latitude": latitude,
+                "longitude": longitude,
+                "geo_latitude": latitude,
+                "geo_longitude": longitude,
+                # Optional back-links to biometric log/punch
+                "biometric_log": punch["log_name"],
+                "biometric_punch": punch["punch_name"],
+            }
+
+            if shift_fields:
+                # Run the controller's fetch_shift against the in-memory
+                # values; hasattr guards sites without HRMS installed
+                tmp = frappe.new_doc("Employee Checkin")
+                tmp.employee = employee
+                tmp.time = punch_dt
+                tmp.log_type = log_type
+                if hasattr(tmp, "fetch_shift"):
+                    try:
+                        tmp.fetch_shift()
+                    except Exception:
+                        frappe.log_error(
+                            frappe.get_traceback(),
+                            f"fetch_shift failed for {employee} at {punch_dt}",
+                        )
+                for f in shift_fields:
+                    checkin[f] = tmp.get(f)
+
+            new_checkins.append(tuple(checkin[f] for f in checkin_fields))
+            existing_checkins.add((employee, punch_dt))
 
             # Mark this punch as synced and link to Employee Checkin if possible
-            update_values = {"synced_to_employee_checkin": 1}
+            synced_names.append(punch["punch_name"])
             if punch_has_employee_checkin:
-                update_values["employee_checkin"] = checkin.name
-
-            frappe.db.set_value(
-                "Biometric Attendance Punch Table",
-                punch["punch_name"],
-                update_values,
-            )
+                checkin_links.append((punch["punch_name"], checkin["name"]))
 
             created += 1
 
@@ -206,18 +310,50 @@ def sync_punches_to_employee_checkin():
             _create_checkin_for_punch(last, "OUT")
 
         # Mark middle punches as synced (but no Employee Checkin)
-        middle = [
-            p
+        synced_names.extend(
+            p["punch_name"]
             for p in group_punches
             if p["punch_name"] not in {first["punch_name"], last["punch_name"]}
-        ]
-        for p in middle:
-            frappe.db.set_value(
-                "Biometric Attendance Punch Table",
-                p["punch_name"],
-                "synced_to_employee_checkin",
-                1,
+        )
+
+    # All writes happen in one transaction: the checkin bulk insert and
+    # both punch UPDATEs land together, or roll back together on failure
+    try:
+        if new_checkins:
+            frappe.db.bulk_insert(
+                "Employee Checkin",
+                fields=checkin_fields,
+                values=new_checkins,
+            )
+
+        # One UPDATE for all sync flags instead of a set_value per punch
+        if synced_names:
+            frappe.db.sql(
+                """
+                UPDATE `tabBiometric Attendance Punch Table`
+                SET synced_to_employee_checkin = 1
+                WHERE name IN %(names)s
+                """,
+                {"names": tuple(synced_names)},
             )
 
+        # One UPDATE for all employee_checkin links as well: ELT(FIELD(...))
+        # maps each punch name to its checkin name in a single statement
+        if checkin_links:
+            punch_names = [p for p, _c in checkin_links]
+            checkin_names = [c for _p, c in checkin_links]
+            placeholders = ", ".join(["%s"] * len(checkin_links))
+            frappe.db.sql(
+                f"""
+                UPDATE `tabBiometric Attendance Punch Table`
+                SET employee_checkin = ELT(FIELD(name, {placeholders}), {placeholders})
+                WHERE name IN ({placeholders})
+                """,
+                punch_names + checkin_names + punch_names,
+            )
+    except Exception:
+        frappe.db.rollback()
+        raise
+
     frappe.db.commit()
     return created, already_synced
@@ -1,5 +1,21 @@
 import frappe
 
+from biometric_integration.employee_checkin_sync import _has_col
+
+
+def _cf_exists(dt, fieldname):
+    """
+    Direct indexed lookup on tabCustom Field. frappe.db.exists would
+    build a query object and fetch the Custom Field meta first — wasted
+    work when patches run during install with a cold cache.
+    """
+    return bool(
+        frappe.db.sql(
+            "SELECT 1 FROM `tabCustom Field` WHERE dt = %s AND fieldname = %s LIMIT 1",
+            (dt, fieldname),
+        )
+    )
+
 
 def execute():
     """
@@ -11,10 +27,7 @@ def execute():
     """
 
     # 1) Synced to Employee Checkin (Check)
-    if not frappe.db.exists(
-        "Custom Field",
-        {"dt": "Biometric Attendance Punch Table", "fieldname": "synced_to_employee_checkin"},
-    ):
+    if not _cf_exists("Biometric Attendance Punch Table", "synced_to_employee_checkin"):
         cf = frappe.get_doc(
             {
                 "doctype": "Custom Field",
@@ -31,10 +44,7 @@ def execute():
         frappe.clear_cache(doctype="Biometric Attendance Punch Table")
 
     # 2) Employee Checkin (Link)  - optional, only used if present
-    if not frappe.db.exists(
-        "Custom Field",
-        {"dt": "Biometric Attendance Punch Table", "fieldname": "employee_checkin"},
-    ):
+    if not _cf_exists("Biometric Attendance Punch Table", "employee_checkin"):
         cf = frappe.get_doc(
             {
                 "doctype": "Custom Field",
@@ -49,3 +59,6 @@ def execute():
         cf.insert(ignore_permissions=True)
         frappe.clear_cache(doctype="Biometric Attendance Punch Table")
 
+    # Sync code caches has_column results; new columns invalidate them
+    _has_col.cache_clear()
+
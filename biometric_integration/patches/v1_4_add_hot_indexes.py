@@ -0,0 +1,40 @@
+import frappe
+from frappe.utils import cint
+
+# Bumped in the schema_version marker once the indexes are in place
+SCHEMA_VERSION = 2
+
+
+def execute():
+    """
+    Add indexes on the columns every sync and report filters on:
+
+    - Biometric Attendance Log           -> (employee_no, event_date), unique
+    - Biometric Attendance Punch Table   -> (parent, punch_time)
+    - Biometric Attendance Punch Table   -> (synced_to_employee_checkin)
+
+    Without these, the duplicate-punch and unsynced-punch lookups scan
+    the punch table. The log index is unique: one log per employee per
+    day is an invariant the sync relies on, and with devices polled
+    concurrently only the database can enforce it (two threads can both
+    miss the same not-yet-committed log). Safe to run multiple times
+    (add_unique/add_index are no-ops when the index already exists), and
+    re-runs short-circuit on the schema_version marker before touching
+    any table.
+    """
+
+    if (
+        cint(
+            frappe.db.get_single_value("Biometric Integration Settings", "schema_version")
+        )
+        >= SCHEMA_VERSION
+    ):
+        return
+
+    frappe.db.add_unique("Biometric Attendance Log", ["employee_no", "event_date"])
+    frappe.db.add_index("Biometric Attendance Punch Table", ["parent", "punch_time"])
+    frappe.db.add_index("Biometric Attendance Punch Table", ["synced_to_employee_checkin"])
+
+    frappe.db.set_single_value(
+        "Biometric Integration Settings", "schema_version", SCHEMA_VERSION
+    )
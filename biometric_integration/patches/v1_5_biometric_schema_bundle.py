@@ -0,0 +1,265 @@
+import frappe
+from frappe.utils import cint
+
+from biometric_integration.employee_checkin_sync import _has_col
+
+SETTINGS_DT = "Biometric Integration Settings"
+
+# Bumped in the schema_version marker once this bundle has run
+SCHEMA_VERSION = 3
+
+# (DocType, insert_after) pairs that get a device_id field
+DEVICE_ID_TARGETS = (
+    ("Biometric Attendance Log", "event_date"),
+    ("Biometric Attendance Punch Table", "punch_type"),
+    ("Employee Checkin", "log_type"),
+)
+
+# Frozen field specs, built once at import time
+DEVICE_ID_SPEC = {
+    dt: [
+        {
+            "fieldname": "device_id",
+            "label": "Device ID",
+            "fieldtype": "Data",
+            "insert_after": insert_after,
+        }
+    ]
+    for dt, insert_after in DEVICE_ID_TARGETS
+}
+
+
+def execute():
+    """
+    Bundled schema patch replacing v1_2_add_device_id_fields and
+    v1_3_adjust_devices_section:
+
+    - Add device_id (Data) on Biometric Attendance Log,
+      Biometric Attendance Punch Table and Employee Checkin
+    - Add the Devices section break on Biometric Integration Settings
+      and move the Devices table field under it (full width)
+    - Add the hidden schema_version marker field on the settings, so the
+      value written below survives settings saves (tabSingles rows
+      without a matching field are wiped on update_single)
+
+    All custom-field work happens in one pass and one explicit DB
+    transaction with a single cache clear at the end — instead of two
+    patches each committing and flushing meta for the same doctypes.
+    Safe to run multiple times.
+    """
+
+    # Cheap idempotency gate: one cached single-value read instead of
+    # re-verifying the whole schema on every bench migrate
+    if cint(frappe.db.get_single_value(SETTINGS_DT, "schema_version")) >= SCHEMA_VERSION:
+        return
+
+    try:
+        _apply_schema_changes()
+        frappe.db.set_single_value(SETTINGS_DT, "schema_version", SCHEMA_VERSION)
+        frappe.db.commit()
+    except Exception:
+        frappe.db.rollback()
+        raise
+
+
+def _apply_schema_changes():
+    # Prime the Custom Field meta once up front — during install/migrate the
+    # meta cache is cold and each insert below would otherwise pay the fetch
+    frappe.get_meta("Custom Field")
+
+    custom_fields = _missing_device_id_fields()
+
+    # One query covers both the devices_section existence check and the
+    # Devices table field lookup below
+    settings_cfs = frappe.get_all(
+        "Custom Field",
+        filters={"dt": SETTINGS_DT},
+        fields=["name", "fieldname", "fieldtype", "options", "insert_after", "columns"],
+    )
+
+    if not any(cf.fieldname == "devices_section" for cf in settings_cfs):
+        custom_fields.setdefault(SETTINGS_DT, []).append(
+            {
+                "fieldname": "devices_section",
+                "label": "Devices",
+                "fieldtype": "Section Break",
+                "insert_after": "end_date_and_time",
+                # full-width section
+                "columns": 0,
+            }
+        )
+
+    if not any(cf.fieldname == "schema_version" for cf in settings_cfs):
+        custom_fields.setdefault(SETTINGS_DT, []).append(
+            {
+                "fieldname": "schema_version",
+                "label": "Schema Version",
+                "fieldtype": "Int",
+                "hidden": 1,
+                "read_only": 1,
+                "no_copy": 1,
+                "print_hide": 1,
+                "insert_after": "end_date_and_time",
+            }
+        )
+
+    if custom_fields:
+        _insert_custom_fields(custom_fields)
+
+    # Collect every doctype we actually touched and invalidate each once
+    # at the end — much cheaper than evicting the whole site cache, and
+    # nothing is cleared at all on no-op re-runs
+    to_clear = set(custom_fields)
+    if _adjust_devices_section(settings_cfs):
+        to_clear.add(SETTINGS_DT)
+
+    for dt in to_clear:
+        frappe.clear_cache(doctype=dt)
+    if to_clear:
+        _has_col.cache_clear()
+
+
+def _insert_custom_fields(custom_fields):
+    """
+    Pure schema work: add the columns with direct DDL, then register the
+    UI bindings by bulk-inserting all the Custom Field rows in one
+    statement. This skips the per-doc insert() pipeline entirely; the
+    final clear_cache in execute() rebuilds meta.
+    """
+    now = frappe.utils.now()
+    user = frappe.session.user
+
+    fields = [
+        "name",
+        "dt",
+        "fieldname",
+        "label",
+        "fieldtype",
+        "insert_after",
+        "columns",
+        "hidden",
+        "read_only",
+        "no_copy",
+        "print_hide",
+        "owner",
+        "modified_by",
+        "creation",
+        "modified",
+    ]
+    values = []
+
+    for dt, specs in custom_fields.items():
+        for spec in specs:
+            # Section Breaks are layout-only; Data fields need a real column
+            if spec["fieldtype"] == "Data":
+                frappe.db.sql_ddl(
+                    f"ALTER TABLE `tab{dt}` "
+                    f"ADD COLUMN `{spec['fieldname']}` varchar(140) DEFAULT NULL"
+                )
+
+            values.append(
+                (
+                    # Custom Field names follow the "{dt}-{fieldname}" convention
+                    f"{dt}-{spec['fieldname']}",
+                    dt,
+                    spec["fieldname"],
+                    spec["label"],
+                    spec["fieldtype"],
+                    spec["insert_after"],
+                    spec.get("columns", 0),
+                    spec.get("hidden", 0),
+                    spec.get("read_only", 0),
+                    spec.get("no_copy", 0),
+                    spec.get("print_hide", 0),
+                    user,
+                    user,
+                    now,
+                    now,
+                )
+            )
+
+    if values:
+        frappe.db.bulk_insert(
+            "Custom Field",
+            fields=fields,
+            values=values,
+            ignore_duplicates=True,
+        )
+
+
+def _col_exists(dt):
+    """
+    Check for a device_id column with a LIMIT 0 SELECT — the SQL parser
+    detects column presence in one parse-only round trip, where an
+    information_schema / DESCRIBE lookup scans table metadata (slow on
+    MariaDB with many tables, and this patch re-runs on every migrate).
+    """
+    try:
+        frappe.db.sql(f"SELECT `device_id` FROM `tab{dt}` LIMIT 0")
+        return True
+    except Exception as e:
+        # pymysql reports "Unknown column" (1054) as OperationalError, not
+        # ProgrammingError — let the driver-aware check classify the error
+        if frappe.db.is_missing_column(e):
+            return False
+        raise
+
+
+def _missing_device_id_fields():
+    """Return the device_id field specs still missing, keyed by DocType."""
+
+    dts = [dt for dt, _insert_after in DEVICE_ID_TARGETS]
+
+    # Existing Custom Fields for all targets in one query
+    existing_cf = set(
+        frappe.get_all(
+            "Custom Field",
+            filters={"dt": ["in", dts], "fieldname": "device_id"},
+            pluck="dt",
+        )
+    )
+
+    # Existing columns (standard or custom), probed per table
+    existing_col = {dt for dt in dts if _col_exists(dt)}
+
+    # Skip targets whose column or Custom Field is already there
+    return {
+        dt: list(specs)
+        for dt, specs in DEVICE_ID_SPEC.items()
+        if dt not in existing_col and dt not in existing_cf
+    }
+
+
+def _adjust_devices_section(settings_cfs):
+    """
+    Move the Devices child table under the devices_section break.
+    Returns True when something was actually written.
+    """
+
+    devices_cf = next(
+        (
+            cf
+            for cf in settings_cfs
+            if cf.fieldtype == "Table" and cf.options == "Biometric Device"
+        ),
+        None,
+    )
+
+    if not devices_cf:
+        # Nothing to adjust (maybe field not created yet)
+        return False
+
+    if devices_cf.insert_after == "devices_section" and not devices_cf.columns:
+        # Already parented correctly (the common case on re-runs)
+        return False
+
+    # Re-parenting is a two-column write — set the values directly instead
+    # of loading, validating and saving the whole Custom Field doc
+    frappe.db.set_value(
+        "Custom Field",
+        devices_cf.name,
+        {"insert_after": "devices_section", "columns": 0},
+        update_modified=False,
+    )
+    frappe.clear_document_cache("Custom Field", devices_cf.name)
+    return True